@@ -1,20 +1,26 @@
-import threading
+import contextvars
 
 from .log_queue import LogQueue
 from .log_record import LogRecord, NullRecord, set_default_log_queue, get_default_log_queue
 
 
-CONTEXT_OBJECT = threading.local()
-CONTEXT_OBJECT.current_log_record = NullRecord()
+# Returned when there is no current record. The log_* helpers check for it by identity, so
+# that logging outside a record costs as little as possible.
+_NULL_RECORD = NullRecord()
+
+_CURRENT_RECORD = contextvars.ContextVar('current_log_record', default=_NULL_RECORD)
 
 
 def set_context_object(context):
     """Override the context object for the global log record.
 
-    By default, uses `threading.local()`, i.e. thread-local storage.
+    By default, uses a `contextvars.ContextVar`, which is local to the current
+    thread or asyncio task. If a context object is given (such as
+    `threading.local()`), the record is stored as an attribute on it instead.
     """
-    global CONTEXT_OBJECT
-    CONTEXT_OBJECT = context
+    global _CURRENT_RECORD, _get_current_record
+    _CURRENT_RECORD = _AttributeContext(context)
+    _get_current_record = _CURRENT_RECORD.get
 
 
 def start_global_log_record(**kwargs):
@@ -44,7 +50,7 @@ def finish_global_log_record(exc=None):
         record.finish()
         return record
     finally:
-        _set_current_record(NullRecord())
+        _set_current_record(_NULL_RECORD)
 
 
 def end_global_log_record(exc=None):
@@ -56,7 +62,15 @@ def log_value(**kwargs):
     """Log values into the currently globally active Log Record."""
     # For some malformed URLs, the records are not initialized,
     # so we check whether there's a current_log_record
-    _get_current_record().set(**kwargs)
+    record = _get_current_record()
+    if record is _NULL_RECORD:
+        return
+    # Pass the kwargs dict along as-is, instead of unpacking it into another one
+    if len(kwargs) == 1:
+        [(key, value)] = kwargs.items()
+        record.set_one(key, value)
+    else:
+        record.update(kwargs)
 
 
 def log_time(name):
@@ -66,12 +80,16 @@ def log_time(name):
 
 def log_counter(name, count=1):
     """Increase the count of something in the currently globally active Log Record."""
-    return _get_current_record().inc(name, count)
+    record = _get_current_record()
+    if record is not _NULL_RECORD:
+        record.inc(name, count)
 
 
 def log_counters(**kwargs):
     """Use keyword args to log counters."""
-    return _get_current_record().inc_all(name, count)
+    record = _get_current_record()
+    if record is not _NULL_RECORD:
+        record.inc_all(**kwargs)
 
 
 def emergency_shutdown():
@@ -109,12 +127,25 @@ def flush():
     get_default_log_queue().flush()
 
 
-def _get_current_record():
-    return getattr(CONTEXT_OBJECT, 'current_log_record', NullRecord())
+# Bound method, so that the log_* helpers don't need an extra Python call to find the record
+_get_current_record = _CURRENT_RECORD.get
 
 
 def _set_current_record(rec):
-    setattr(CONTEXT_OBJECT, 'current_log_record', rec)
+    _CURRENT_RECORD.set(rec)
+
+
+class _AttributeContext:
+    """Stores the current record on a context object, looking like a ContextVar."""
+
+    def __init__(self, context):
+        self.context = context
+
+    def get(self):
+        return getattr(self.context, 'current_log_record', _NULL_RECORD)
+
+    def set(self, rec):
+        setattr(self.context, 'current_log_record', rec)
 
 
 class GlobalLogRecord(LogRecord):
@@ -124,6 +155,8 @@ class GlobalLogRecord(LogRecord):
     alternative to calling 'finish_global_log_record'.
     """
 
+    __slots__ = ()
+
     def __exit__(self, type, value, tb):
         """Call finish_global_log_record."""
         finish_global_log_record(exc=value)
\ No newline at end of file
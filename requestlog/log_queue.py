@@ -1,14 +1,36 @@
+import atexit
 import collections
 import glob
 import json
 import logging
 import os
+import queue
+import random
 import threading
 import time
 import traceback
+import uuid
+import weakref
 
 from .sinks import DefaultSink
 
+try:
+    import orjson
+
+    def _dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
+    _loads = json.loads
+
+# Put in the inbox to stop the send thread
+_STOP = object()
+
+
 class LogQueue:
     """A queue of records that still need to be written out.
 
@@ -25,35 +47,62 @@ class LogQueue:
     Upon 'wake' events (every batch window seconds), a background thread
     wakes up and collects all events from previous time windows.
 
+    With a batch window of 0, records are put in an inbox instead, and a
+    background thread passes them to the sink as soon as it can, batching
+    up whatever arrived while the sink was busy. This way, threads that
+    submit records never wait for the sink. The thread is started when the
+    first record comes in, and whatever it hasn't sent yet is sent when the
+    interpreter exits.
+
     We need to use a mutex since the dict we keep the queue in is not
     thread-safe. We do as little work as possible every time we hold the mutex
-    to allow for maximum parallelism.
+    to allow for maximum parallelism: producers only append to a bucket, and
+    the writer sends records to the sink without holding it.
+
+    Buckets are kept in insertion order, which is time order as long as the
+    clock doesn't go backwards, so we don't need to sort them to find the
+    ones that are due.
     """
 
     def __init__(self, name, batch_window_s):
         self.name = name
-        self.records_queue = collections.defaultdict(list)
+        self.records_queue = {}
+        self.out_of_order = False
         self.batch_window_s = batch_window_s
+        self.batch_window_ns = int(batch_window_s * 1_000_000_000)
         self.sink = DefaultSink()
         self.mutex = threading.Lock()
         self.running = True
-        self.wake_event = threading.Event()
-        if self.batch_window_s > 0:
-            self.thread = threading.Thread(target=self._write_thread, name=f"{self.name}Writer", daemon=True)
-            self.thread.start()
+        self.wake_condition = threading.Condition()
+        self.inbox = queue.SimpleQueue()
+        self.thread = None
+        if self.batch_window_ns:
+            self._start_thread()
+        _LIVE_QUEUES.add(self)
 
     def stop(self):
-        self.running = False
-        self.wake_event.set()
+        with self.wake_condition:
+            self.running = False
+            self.wake_condition.notify_all()
+        if not self.batch_window_ns:
+            self.inbox.put(_STOP)
 
     def submit(self, data):
-        bucket = div_clip(time.time(), self.batch_window_s)
+        if not self.batch_window_ns:
+            if self.thread is None:
+                self._start_send_thread()
+            self.inbox.put(data)
+            if not self.running:
+                # We may have raced stop(), in which case the send thread could be gone
+                self._send_inbox_now()
+            return
 
+        bucket = time.time_ns() // self.batch_window_ns * self.batch_window_s
         with self.mutex:
-            self.records_queue[bucket].append(data)
-
-        if self.batch_window_s == 0:
-            self.flush()
+            records = self.records_queue.get(bucket)
+            if records is None:
+                records = self._get_bucket(bucket)
+            records.append(data)
 
     def set_sink(self, sink):
         """Configure a function that will be called for every set of records.
@@ -73,20 +122,39 @@ class LogQueue:
         """Save all untransmitted records to disk.
 
         They will be picked up and attempted to be transmitted by a future
-        (restarted) process.
+        (restarted) process. Records are written in JSON Lines format, using
+        `orjson` if it is installed.
         """
+        inbox_records, waiters, stop = self._drain_inbox()
+        if stop:
+            self.inbox.put(_STOP)
+
         all_records = []
         with self.mutex:
-            for records in self.records_queue.values():
+            for records in list(self.records_queue.values()):
                 all_records.extend(records)
             self.records_queue.clear()
+        all_records.extend(inbox_records)
+
+        for waiter in waiters:
+            waiter.set()
 
         if not all_records:
             return
 
+        data = memoryview(b"".join(_dumps(record) + b"\n" for record in all_records))
         filename = f"{self.name}_dump.{os.getpid()}.{time.time()}.jsonl"
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(all_records, f)
+
+        # We may only have moments left, so write everything in as few system calls
+        # as possible, and make sure it has reached the disk before we return.
+        fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            while data:
+                written = os.write(fd, data)
+                data = data[written:]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
 
     def try_load_emergency_saves(self):
         """Try to load emergency saves from disk, if found.
@@ -96,70 +164,260 @@ class LogQueue:
         loads a single file (in order to avoid record duplication).
 
         We use the atomicity of renaming the file as a way of claiming ownership of it.
+        Every process goes through the files in a different order and renames them to a
+        name of its own, so that processes starting at the same time mostly don't
+        compete for the same files.
         """
         candidates = glob.glob(f"{self.name}_dump.*.jsonl")
+        random.shuffle(candidates)
         for candidate in candidates:
             try:
-                claim_name = candidate + ".claimed"
-                os.rename(candidate, claim_name)
+                claim_name = f"{candidate}.claimed.{os.getpid()}.{uuid.uuid4().hex}"
+                os.replace(candidate, claim_name)
 
                 # If this succeeded, we're guaranteed to be able to read this file (and because
                 # we renamed it to something not matching the glob pattern, no one else is going to
                 # try to pick it up later)
-                with open(claim_name, "r", encoding="utf-8") as f:
-                    all_records = json.load(f)
+                with open(claim_name, "rb") as f:
+                    all_records = _load_records(f)
 
                 bucket = div_clip(time.time(), self.batch_window_s)
                 with self.mutex:
-                    self.records_queue[bucket].extend(all_records)
+                    self._get_bucket(bucket).extend(all_records)
                 os.unlink(claim_name)
             except OSError:
                 pass
 
     def flush(self, max_time=None):
         """(Try to) transmit all pending records with recording timestamps
-        smaller than the given time now."""
-        with self.mutex:
-            keys = list(self.records_queue.keys())
-        keys.sort()
+        smaller than the given time now.
 
+        Without a batch window, this waits until the send thread has passed
+        all records submitted so far to the sink.
+        """
+        if not self.batch_window_ns and threading.current_thread() is not self.thread:
+            if not self._wait_for_send_thread():
+                # The send thread was stopped or never started, send whatever is left ourselves
+                self._send_inbox_now()
+
+        self._flush_queue(max_time)
+
+    def _wait_for_send_thread(self):
+        """Wait until the send thread has handled everything in the inbox.
+
+        Returns False if there is no send thread to wait for.
+        """
+        thread = self.thread
+        if thread is None or not thread.is_alive():
+            return False
+        done = threading.Event()
+        self.inbox.put(done)
+        while not done.wait(timeout=0.1):
+            if not thread.is_alive():
+                return False
+        return True
+
+    def _flush_queue(self, max_time=None):
+        """Send the buckets in the queue that are older than max_time."""
         max_time = max_time or time.time()
-        buckets_to_send = [k for k in keys if k < max_time]
 
-        for bucket_ts in buckets_to_send:
-            # Get the records out of the queue
-            with self.mutex:
-                bucket_records = self.records_queue[bucket_ts]
+        # Take all buckets we're going to send out of the queue in one go
+        with self.mutex:
+            if self.out_of_order:
+                self.records_queue = dict(sorted(self.records_queue.items()))
+                self.out_of_order = False
 
-            # Try to send the records (to signal failure, this can either
-            # throw or return False, depending on how loud it wants to be).
-            success = self._save_records(bucket_ts, bucket_records)
+            buckets_to_send = []
+            for bucket_ts in self.records_queue:
+                if bucket_ts >= max_time:
+                    break
+                buckets_to_send.append(bucket_ts)
+            batches = [(k, self.records_queue.pop(k)) for k in buckets_to_send]
+
+        failed = []
+        sent = 0
+        try:
+            for bucket_ts, bucket_records in batches:
+                # Try to send the records (to signal failure, this can either
+                # throw or return False, depending on how loud it wants to be).
+                if self._save_records(bucket_ts, list(bucket_records)) is False:
+                    failed.append((bucket_ts, bucket_records))
+                sent += 1
+        finally:
+            # Put back whatever failed, or whatever we didn't get to because a sink threw
+            unsent = failed + batches[sent:]
+            if unsent:
+                with self.mutex:
+                    for bucket_ts, bucket_records in unsent:
+                        self._get_bucket(bucket_ts).extendleft(reversed(bucket_records))
+
+    def _get_bucket(self, bucket_ts):
+        """Return the deque for the given bucket, creating it if necessary.
 
-            # Remove them from the queue if sending didn't fail
-            if success is not False:
+        Must be called with the mutex held.
+        """
+        records = self.records_queue.get(bucket_ts)
+        if records is None:
+            if self.records_queue and bucket_ts < next(reversed(self.records_queue)):
+                self.out_of_order = True
+            records = self.records_queue[bucket_ts] = collections.deque()
+        return records
+
+    def _drain_inbox(self, item=None):
+        """Take everything out of the inbox without blocking.
+
+        Returns the records, the events of flushes waiting for them, and
+        whether the send thread was asked to stop.
+        """
+        records = []
+        waiters = []
+        stop = False
+        while True:
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item is not None:
+                records.append(item)
+            try:
+                item = self.inbox.get_nowait()
+            except queue.Empty:
+                return records, waiters, stop
+
+    def _send_inbox_now(self):
+        """Send the records in the inbox on the current thread."""
+        records, waiters, stop = self._drain_inbox()
+        try:
+            self._send_now(records)
+        finally:
+            for waiter in waiters:
+                waiter.set()
+            # Not ours to take: let the send thread see it
+            if stop:
+                self.inbox.put(_STOP)
+
+    def _send_now(self, records):
+        """Send records to the sink right away, bypassing the queue.
+
+        The records are only queued if sending them fails, so they can be retried later.
+        """
+        timestamp = time.time()
+        success = False
+        try:
+            # Retry earlier failures first
+            if self.records_queue:
+                self._flush_queue()
+            if records:
+                success = self._save_records(timestamp, records)
+        finally:
+            if success is False and records:
                 with self.mutex:
-                    del self.records_queue[bucket_ts]
+                    self._get_bucket(timestamp).extend(records)
 
     def _save_records(self, timestamp, records):
           return self.sink(timestamp, records)
 
+    def _start_thread(self):
+        target = self._write_thread if self.batch_window_ns else self._send_thread
+        self.thread = threading.Thread(target=target, name=f"{self.name}Writer", daemon=True)
+        self.thread.start()
+
+    def _start_send_thread(self):
+        with self.mutex:
+            if self.thread is None and self.running:
+                self._start_thread()
+
+    def _send_thread(self):
+        """Background thread which passes records from the inbox to the sink."""
+        while True:
+            records, waiters, stop = self._drain_inbox(self.inbox.get())
+            try:
+                self._send_now(records)
+            except Exception:
+                traceback.print_exc()
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                break
+
     def _write_thread(self):
         """Background thread which will wake up every batch_window_s seconds
         to emit records from the queue."""
-        next_wake = div_clip(time.time(), self.batch_window_s) + self.batch_window_s
-        while self.running:
+        while True:
             try:
-                # Interruptible sleep for next wake time
-                self.wake_event.wait(timeout=max(0, next_wake - time.time()))
-                if not self.running:
-                    break
+                # Interruptible sleep until the end of the current window
+                now = time.time()
+                next_wake = div_clip(now, self.batch_window_s) + self.batch_window_s
+                with self.wake_condition:
+                    if self.wake_condition.wait_for(lambda: not self.running, timeout=next_wake - now):
+                        break
+
+                # Once woken, push all buckets from windows that have ended. Look at
+                # the clock again, in case it jumped forward while we were asleep.
+                self._flush_queue(max(next_wake, div_clip(time.time(), self.batch_window_s)))
+            except Exception:
+                traceback.print_exc()
+
+
+_LIVE_QUEUES = weakref.WeakSet()
+
 
-                # Once woken, see what buckets we have left to push (all buckets
-                # with numbers lower than next_wake)
-                self.flush(next_wake)
+def _restart_threads_after_fork():
+    """Background threads don't survive a fork, so start new ones in the child.
+
+    Records that were pending at the time of the fork are left to the parent.
+    """
+    for log_queue in list(_LIVE_QUEUES):
+        log_queue.mutex = threading.Lock()
+        log_queue.wake_condition = threading.Condition()
+        log_queue.inbox = queue.SimpleQueue()
+        log_queue.records_queue = {}
+        log_queue.out_of_order = False
+        log_queue.thread = None
+        if log_queue.running and log_queue.batch_window_ns:
+            log_queue._start_thread()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_threads_after_fork)
+
+
+@atexit.register
+def _flush_at_exit():
+    """Send records that are still waiting for the send thread when the interpreter exits.
+
+    Queues with a batch window are left alone, as before; use 'emergency_shutdown'
+    to keep those records.
+    """
+    for log_queue in list(_LIVE_QUEUES):
+        if not log_queue.batch_window_ns:
+            try:
+                log_queue.flush()
             except Exception:
                 traceback.print_exc()
-            next_wake += self.batch_window_s
+
+
+def _load_records(f):
+    """Load the records from an emergency save.
+
+    Lines that can't be parsed (for example, because the process was killed
+    while writing them) are skipped. Older versions wrote a single JSON array
+    instead of one record per line, which we still accept.
+    """
+    records = []
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            loaded = _loads(line)
+        except ValueError:
+            continue
+        if isinstance(loaded, list):
+            records.extend(loaded)
+        else:
+            records.append(loaded)
+    return records
 
 
 def div_clip(x, y):
@@ -1,4 +1,3 @@
-import datetime
 import functools
 import os
 import threading
@@ -19,29 +18,59 @@ if not IS_WINDOWS:
         # Not on a platform that supports RUSAGE_THREAD
         pass
 
+# These don't change during the lifetime of the process (except the PID, after a fork)
+_PID = os.getpid()
+_DYNO = os.getenv("DYNO")
+
+
+def _refresh_pid():
+    global _PID
+    _PID = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_refresh_pid)
+
+# The load average only moves every couple of seconds, no need to ask for it more often
+LOADAVG_REFRESH_NS = 1_000_000_000
+_LOADAVG_CACHE = (None, None)
+
 
 class LogRecord:
-    """A log record."""
+    """A log record.
+
+    Set `LogRecord.collect_rusage = False` to skip collecting resource usage
+    and load average, saving a couple of system calls per record.
+    """
+
+    __slots__ = ('queue', 'start_time', 'start_ns', 'start_rusage', 'attributes', 'running_timers', '_timer_pool', '__weakref__')
+
+    collect_rusage = True
 
     def __init__(self, queue=None, **kwargs):
         self.queue = queue or LOG_QUEUE
         self.start_time = time.time()
+        self.start_ns = time.monotonic_ns()
 
-        if not IS_WINDOWS:
-            self.start_rusage = resource.getrusage(resource.RUSAGE_SELF)
-        self.attributes = kwargs
-        self.running_timers = set([])
-        loadavg = os.getloadavg()[0] if not IS_WINDOWS else None
-        self.set(start_time=dtfmt(self.start_time), pid=os.getpid(), loadavg=loadavg, fault=0)
+        collect_rusage = self.collect_rusage and not IS_WINDOWS
+        self.start_rusage = resource.getrusage(resource.RUSAGE_SELF) if collect_rusage else None
+        self.running_timers = {}
+        self._timer_pool = {}
+
+        # Store the standard fields directly; going through set() would build a throwaway kwargs dict
+        self.attributes = attributes = kwargs
+        attributes['start_time'] = dtfmt(self.start_time)
+        attributes['pid'] = _PID
+        attributes['loadavg'] = _loadavg() if collect_rusage else None
+        attributes['fault'] = 0
 
         # If running on Heroku
-        dyno = os.getenv("DYNO")
-        if dyno:
-            self.set(dyno=dyno)
+        if _DYNO:
+            attributes['dyno'] = _DYNO
 
     def finish(self):
-        end_time = time.time()
-        if not IS_WINDOWS:
+        duration_ns = time.monotonic_ns() - self.start_ns
+        if self.start_rusage is not None:
             end_rusage = resource.getrusage(resource.RUSAGE_SELF)
             user_ms = ms_from_fsec(end_rusage.ru_utime - self.start_rusage.ru_utime)
             sys_ms = ms_from_fsec(end_rusage.ru_stime - self.start_rusage.ru_stime)
@@ -53,17 +82,18 @@ class LogRecord:
             max_rss = None
             inc_max_rss = None
 
-        self.set(
-            end_time=dtfmt(end_time),
-            user_ms=user_ms,
-            sys_ms=sys_ms,
-            max_rss=max_rss,
-            inc_max_rss=inc_max_rss,
-            duration_ms=ms_from_fsec(end_time - self.start_time),
-        )
+        attributes = self.attributes
+        attributes['end_time'] = dtfmt(self.start_time + duration_ns / 1_000_000_000)
+        attributes['user_ms'] = user_ms
+        attributes['sys_ms'] = sys_ms
+        attributes['max_rss'] = max_rss
+        attributes['inc_max_rss'] = inc_max_rss
+        attributes['duration_ms'] = duration_ns // 1_000_000
 
         # There should be 0, but who knows
         self._terminate_running_timers()
+        # The pooled timers point back at us, don't keep that cycle around
+        self._timer_pool.clear()
 
         self.queue.submit(self.as_data())
 
@@ -75,18 +105,29 @@ class LogRecord:
         """Set keys based on keyword arguments."""
         self.attributes.update(kwargs)
 
+    def set_one(self, key, value):
+        """Set a single key."""
+        self.attributes[key] = value
+
     def update(self, dict):
         """Set keys based on a dictionary."""
         self.attributes.update(dict)
 
     def timer(self, name):
-        return LogTimer(self, name)
+        """Return a timer for the given name.
+
+        Timers that have finished are reused. A timer can be entered again,
+        also while it is already running.
+        """
+        # Taking the timer out of the pool makes sure no two callers get the same one
+        timer = self._timer_pool.pop(name, None)
+        if timer is None:
+            timer = LogTimer(self, name)
+        return timer
 
     def inc(self, name, amount=1):
-        if name in self.attributes:
-            self.attributes[name] = self.attributes[name] + amount
-        else:
-            self.attributes[name] = amount
+        attributes = self.attributes
+        attributes[name] = attributes.get(name, 0) + amount
 
     def inc_all(self, **kwargs):
         for key, value in kwargs.items():
@@ -115,15 +156,21 @@ class LogRecord:
         return self.attributes
 
     def _remember_timer(self, timer):
-        self.running_timers.add(timer)
+        self.running_timers[id(timer)] = timer
+        # A finished timer may be entered again by whoever kept it; timer() must not hand it out meanwhile
+        pooled = self._timer_pool.pop(timer.name, None)
+        if pooled is not None and pooled is not timer:
+            self._timer_pool[timer.name] = pooled
 
     def _forget_timer(self, timer):
-        if timer in self.running_timers:
-            self.running_timers.remove(timer)
+        self.running_timers.pop(id(timer), None)
+        # Finished timers can be handed out again by timer()
+        self._timer_pool[timer.name] = timer
 
     def _terminate_running_timers(self):
-        for timer in list(self.running_timers):
-            timer.finish()
+        for timer in list(self.running_timers.values()):
+            while timer.running:
+                timer.finish()
 
     def __enter__(self):
         return self
@@ -140,6 +187,8 @@ class NullRecord(LogRecord):
     Will be returned if we don't have a default record.
     """
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         pass
 
@@ -149,6 +198,15 @@ class NullRecord(LogRecord):
     def set(self, **kwargs):
         pass
 
+    def set_one(self, key, value):
+        pass
+
+    def update(self, dict):
+        pass
+
+    def timer(self, name):
+        return LogTimer(self, name)
+
     def _remember_timer(self, _):
         pass
 
@@ -171,30 +229,71 @@ class NullRecord(LogRecord):
         self.set(fault=1, error_message=str(exc))
 
 
+def _loadavg():
+    """Return the 1-minute load average, cached for LOADAVG_REFRESH_NS."""
+    global _LOADAVG_CACHE
+    now = time.monotonic_ns()
+    taken, value = _LOADAVG_CACHE
+    if taken is None or now - taken >= LOADAVG_REFRESH_NS:
+        value = os.getloadavg()[0]
+        _LOADAVG_CACHE = (now, value)
+    return value
+
+
+_DTFMT_CACHE = {}
+
+
 def dtfmt(timestamp):
-    dt = datetime.datetime.utcfromtimestamp(timestamp)
-    return dt.isoformat() + "Z"
+    """Format a UNIX timestamp as an ISO 8601 UTC timestamp.
+
+    Gives the same result as `datetime.utcfromtimestamp(timestamp).isoformat() + "Z"`,
+    but caches the formatted date and time per second, since many records share
+    the same second.
+    """
+    sec = int(timestamp)
+    us = round((timestamp - sec) * 1_000_000)
+    if us >= 1_000_000:
+        sec += 1
+        us -= 1_000_000
+
+    base = _DTFMT_CACHE.get(sec)
+    if base is None:
+        if len(_DTFMT_CACHE) >= 64:
+            _DTFMT_CACHE.clear()
+        base = _DTFMT_CACHE[sec] = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+
+    if us:
+        return f"{base}.{us:06d}Z"
+    return base + "Z"
 
 
 class LogTimer:
     """A quick and dirty timer."""
 
+    __slots__ = ('record', 'name', 'start_ns')
+
     def __init__(self, record, name):
         self.record = record
         self.name = name
-        self.running = False
+        # One start time per time the timer has been entered and not yet finished
+        self.start_ns = []
+
+    @property
+    def running(self):
+        return bool(self.start_ns)
 
     def finish(self):
-        if self.running:
-            delta = ms_from_fsec(time.time() - self.start)
+        if self.start_ns:
+            delta = (time.monotonic_ns() - self.start_ns.pop()) // 1_000_000
             self.record.inc_timer(self.name, delta)
-            self.record._forget_timer(self)
-            self.running = False
+            # Only hand the timer back once it has stopped running
+            if not self.start_ns:
+                self.record._forget_timer(self)
 
     def __enter__(self):
-        self.record._remember_timer(self)
-        self.start = time.time()
-        self.running = True
+        if not self.start_ns:
+            self.record._remember_timer(self)
+        self.start_ns.append(time.monotonic_ns())
 
     def __exit__(self, type, value, tb):
         self.finish()
@@ -209,7 +308,7 @@ LOG_QUEUE = LogQueue("requestlog", batch_window_s=0)
 
 def set_default_log_queue(log_queue: LogQueue):
     global LOG_QUEUE
-    log_queue.stop()
+    LOG_QUEUE.stop()
     LOG_QUEUE = log_queue
 
 
@@ -217,8 +316,17 @@ def get_default_log_queue():
     return LOG_QUEUE
 
 
+_CLASS_NAME_CACHE = {}
+
+
 def get_full_class_name(obj):
-    module = obj.__class__.__module__
-    if module is None or module == str.__class__.__module__:
-        return obj.__class__.__name__
-    return module + '.' + obj.__class__.__name__
\ No newline at end of file
+    cls = obj.__class__
+    name = _CLASS_NAME_CACHE.get(cls)
+    if name is None:
+        module = cls.__module__
+        if module is None or module == 'builtins':
+            name = cls.__qualname__
+        else:
+            name = f'{module}.{cls.__qualname__}'
+        _CLASS_NAME_CACHE[cls] = name
+    return name
@@ -17,8 +17,7 @@ class PrintSink:
         self.stream = stream
 
     def __call__(self, ts, records):
-        for record in records:
-            self.stream.write('%r\n' % record)
+        self.stream.write(''.join('%r\n' % record for record in records))
 
 
 class DefaultSink(PrintSink):
@@ -28,10 +27,14 @@ class DefaultSink(PrintSink):
         self.warn = True
 
     def __call__(self, ts, records):
+        # Subclasses keep their class (see below), so they need the flag to warn only once
         if self.warn:
             self.stream.write('WARNING: No sink configured for requestlog. Call requestlog.initialize(sink=...)\n')
             self.warn = False
-        super().__call__(ts, records)
+            if type(self) is DefaultSink:
+                # We only need to warn once: from now on, behave like a plain PrintSink
+                self.__class__ = PrintSink
+        PrintSink.__call__(self, ts, records)
 
 
 class LoggerSink:
@@ -40,5 +43,8 @@ class LoggerSink:
         self.logger = logger or logging.getLogger('requestlog')
 
     def __call__(self, ts, records):
+        # Don't bother formatting records nobody is going to see
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         for record in records:
             self.logger.debug(repr(record))
\ No newline at end of file
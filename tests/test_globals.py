@@ -1,3 +1,4 @@
+import threading
 import unittest
 
 import requestlog
@@ -14,4 +15,37 @@ class TestGlobals(RequestLogSuite):
 
         self.assertEqual(len(self.records), 1)
         self.assertEqual(self.records[0]['banaan'], 'geel')
-        self.assertEqual(self.records[0]['bloem'], 'rood')
\ No newline at end of file
+        self.assertEqual(self.records[0]['bloem'], 'rood')
+
+    def test_record_per_thread(self):
+        """Every thread has its own global log record."""
+        requestlog.start_global_log_record(banaan='geel')
+
+        def other_thread():
+            requestlog.start_global_log_record(banaan='groen')
+            requestlog.finish_global_log_record()
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+
+        requestlog.finish_global_log_record()
+
+        self.assertEqual([r['banaan'] for r in self.records], ['groen', 'geel'])
+
+    def test_counters(self):
+        with requestlog.begin_global_log_record():
+            requestlog.log_counter('records', 5)
+            requestlog.log_counters(records=2, pages=1)
+
+        self.assertEqual(self.records[0]['records'], 7)
+        self.assertEqual(self.records[0]['pages'], 1)
+
+    def test_logging_without_record(self):
+        """Logging outside of a global log record does nothing."""
+        requestlog.log_value(bloem='rood')
+        requestlog.log_counter('records')
+        requestlog.log_counters(records=2)
+        with requestlog.log_time('something'):
+            pass
+
+        self.assertEqual(self.records, [])
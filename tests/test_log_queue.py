@@ -1,9 +1,50 @@
+import os
+import subprocess
+import sys
+import threading
+import time
 import unittest
+from unittest import mock
 import requestlog
 
 from .base_test import RequestLogSuite
 
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 class TestRequestLog(RequestLogSuite):
+    def test_concurrent_submit_and_flush(self):
+        """No records are lost when flushing while other threads submit."""
+        queue = requestlog.log_queue.LogQueue('requestlog', batch_window_s=0.001)
+        queue.stop()
+        queue.set_sink(self._fake_sink)
+        producers_done = threading.Event()
+
+        def produce():
+            for i in range(20000):
+                queue.submit(i)
+
+        def consume():
+            while not producers_done.is_set():
+                queue.flush(max_time=float('inf'))
+
+        old_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            producers = [threading.Thread(target=produce) for _ in range(4)]
+            consumer = threading.Thread(target=consume)
+            consumer.start()
+            for producer in producers:
+                producer.start()
+            for producer in producers:
+                producer.join()
+            producers_done.set()
+            consumer.join()
+        finally:
+            sys.setswitchinterval(old_interval)
+        queue.flush(max_time=float('inf'))
+
+        self.assertEqual(len(self._records), 80000)
+
     def test_emergency_recovery_local(self):
         """Test emergency recovery using specific queues."""
         saving_queue = requestlog.log_queue.LogQueue('requestlog', batch_window_s=300)
@@ -52,4 +93,111 @@ class TestRequestLog(RequestLogSuite):
         # self.assertEqual(self._records[0]['terminated'], True)
 
         # Reset the global config
-        requestlog.initialize(batch_window_s=0)
\ No newline at end of file
+        requestlog.initialize(batch_window_s=0)
+
+    def test_failed_sink_is_retried(self):
+        """Records are kept in the queue if the sink reports failure."""
+        queue = requestlog.log_queue.LogQueue('requestlog', batch_window_s=300)
+        attempts = []
+        def flaky_sink(ts, records):
+            attempts.append(list(records))
+            return len(attempts) > 1
+        queue.set_sink(flaky_sink)
+
+        with requestlog.LogRecord(queue=queue, banaan='geel'):
+            pass
+
+        queue.flush(max_time=float('inf'))
+        queue.flush(max_time=float('inf'))
+        queue.flush(max_time=float('inf'))
+
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(attempts[1][0]['banaan'], 'geel')
+
+    def test_load_damaged_emergency_save(self):
+        """Unreadable lines are skipped, and the old single-array format is still accepted."""
+        with open('requestlog_damaged_dump.1.2.jsonl', 'w', encoding='utf-8') as f:
+            f.write('[{"banaan": "geel"}]\n{"banaan": "groen"}\n{"banaan": "bru')
+
+        recovered_queue = requestlog.log_queue.LogQueue('requestlog_damaged', batch_window_s=300)
+        recovered_queue.try_load_emergency_saves()
+        recovered_queue.set_sink(self._fake_sink)
+        recovered_queue.flush()
+
+        self.assertEqual([r['banaan'] for r in self._records], ['geel', 'groen'])
+
+    def test_failed_sink_is_retried_without_batch_window(self):
+        """Without a batch window, failed records are retried in the background."""
+        queue = requestlog.log_queue.LogQueue('requestlog', batch_window_s=0)
+        attempts = []
+        delivered = []
+        def flaky_sink(ts, records):
+            attempts.append(records)
+            if len(attempts) == 1:
+                return False
+            delivered.extend(r['banaan'] for r in records)
+        queue.set_sink(flaky_sink)
+
+        with requestlog.LogRecord(queue=queue, banaan='geel'):
+            pass
+        with requestlog.LogRecord(queue=queue, banaan='groen'):
+            pass
+        queue.flush()
+        queue.stop()
+
+        self.assertGreater(len(attempts), 1)
+        self.assertEqual(delivered, ['geel', 'groen'])
+
+    def test_wall_clock_jump(self):
+        """Records are still sent on time after the wall clock jumps forward."""
+        queue = requestlog.log_queue.LogQueue('requestlog', batch_window_s=0.2)
+        queue.set_sink(self._fake_sink)
+        try:
+            time.sleep(0.3)
+            real_time, real_time_ns = time.time, time.time_ns
+            with mock.patch('time.time', lambda: real_time() + 5), \
+                    mock.patch('time.time_ns', lambda: real_time_ns() + 5_000_000_000):
+                with requestlog.LogRecord(queue=queue, banaan='geel'):
+                    pass
+                deadline = real_time() + 1.5
+                while not self._records and real_time() < deadline:
+                    time.sleep(0.05)
+        finally:
+            queue.stop()
+
+        self.assertEqual(self._records[0]['banaan'], 'geel')
+
+    def test_records_sent_at_exit(self):
+        """Records are sent when the process exits, even without a flush."""
+        script = '\n'.join([
+            'import sys, requestlog',
+            'requestlog.initialize(sink=requestlog.sinks.PrintSink(sys.stdout), load_emergency_saves=False)',
+            'for i in range(3):',
+            '    with requestlog.begin_global_log_record(banaan=i):',
+            '        pass',
+        ])
+        output = subprocess.run([sys.executable, '-c', script], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True).stdout
+
+        self.assertEqual(len(output.splitlines()), 3)
+
+    def test_import_starts_no_thread(self):
+        script = 'import threading, requestlog; print(threading.active_count())'
+        output = subprocess.run([sys.executable, '-c', script], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True).stdout
+
+        self.assertEqual(output.strip(), '1')
+
+    def test_submit_after_stop(self):
+        """Records submitted to a stopped queue are still sent."""
+        queue = requestlog.log_queue.LogQueue('requestlog', batch_window_s=0)
+        queue.set_sink(self._fake_sink)
+        with requestlog.LogRecord(queue=queue, banaan='geel'):
+            pass
+        queue.stop()
+        queue.thread.join()
+
+        with requestlog.LogRecord(queue=queue, banaan='groen'):
+            pass
+
+        self.assertEqual([r['banaan'] for r in self._records], ['geel', 'groen'])
@@ -1,4 +1,8 @@
+import datetime
+import gc
+import time
 import unittest
+import weakref
 
 import requestlog
 
@@ -44,3 +48,80 @@ class TestRequestLog(RequestLogSuite):
 
         self.assertEqual(self.records[0]['fault'], 1)
         self.assertEqual(self.records[0]['error_class'], 'tests.submodule.MyException')
+
+    def test_without_rusage(self):
+        requestlog.LogRecord.collect_rusage = False
+        try:
+            with requestlog.LogRecord():
+                pass
+        finally:
+            requestlog.LogRecord.collect_rusage = True
+
+        self.assertIsNone(self.records[0]['loadavg'])
+        self.assertIsNone(self.records[0]['user_ms'])
+        self.assertIn('duration_ms', self.records[0])
+
+    def test_dtfmt(self):
+        for ts in [0, 1700000000, 1700000000.5, 1700000000.0000004, 1700000000.9999996]:
+            expected = datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+            self.assertEqual(requestlog.log_record.dtfmt(ts), expected)
+
+    def test_nested_timers(self):
+        with requestlog.LogRecord() as record:
+            with record.timer('something'):
+                with record.timer('something'):
+                    pass
+            with record.timer('something'):
+                pass
+
+        self.assertEqual(self.records[0]['something_cnt'], 3)
+
+    def test_timers_are_not_shared(self):
+        with requestlog.LogRecord() as record:
+            outer = record.timer('something')
+            inner = record.timer('something')
+            with outer:
+                with inner:
+                    pass
+
+        self.assertIsNot(outer, inner)
+        self.assertEqual(self.records[0]['something_cnt'], 2)
+
+    def test_reentered_timer(self):
+        with requestlog.LogRecord() as record:
+            timer = record.timer('db')
+            for _ in range(3):
+                with timer:
+                    time.sleep(0.02)
+                    with record.timer('db'):
+                        pass
+
+        self.assertEqual(self.records[0]['db_cnt'], 6)
+        self.assertGreaterEqual(self.records[0]['db_ms'], 60)
+
+    def test_nested_entry_of_same_timer(self):
+        with requestlog.LogRecord() as record:
+            timer = record.timer('db')
+            with timer:
+                with timer:
+                    time.sleep(0.02)
+
+        self.assertEqual(self.records[0]['db_cnt'], 2)
+        self.assertGreaterEqual(self.records[0]['db_ms'], 40)
+
+    def test_finished_record_is_freed(self):
+        """A finished record doesn't need the cyclic garbage collector to be freed."""
+        gc.disable()
+        try:
+            with requestlog.LogRecord() as record:
+                with record.timer('something'):
+                    pass
+            ref = weakref.ref(record)
+            del record
+            self.assertIsNone(ref())
+        finally:
+            gc.enable()
+
+    def test_weakref(self):
+        record = requestlog.LogRecord()
+        self.assertIs(weakref.ref(record)(), record)
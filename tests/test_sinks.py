@@ -1,3 +1,4 @@
+import io
 import logging
 import unittest
 
@@ -9,6 +10,26 @@ class TestSinks(unittest.TestCase):
     requestlog.initialize(sink=requestlog.sinks.DefaultSink())
     self.log_something()
 
+  def test_defaultsink_warns_once(self):
+    stream = io.StringIO()
+    requestlog.initialize(sink=requestlog.sinks.DefaultSink(stream))
+    self.log_something()
+    self.log_something()
+    self.assertEqual(stream.getvalue().count('WARNING'), 1)
+    self.assertEqual(stream.getvalue().count('start_time'), 2)
+
+  def test_defaultsink_subclass(self):
+    class TaggedSink(requestlog.sinks.DefaultSink):
+      def __call__(self, ts, records):
+        super().__call__(ts, [dict(r, tagged=True) for r in records])
+
+    stream = io.StringIO()
+    requestlog.initialize(sink=TaggedSink(stream))
+    self.log_something()
+    self.log_something()
+    self.assertEqual(stream.getvalue().count('WARNING'), 1)
+    self.assertEqual(stream.getvalue().count("'tagged': True"), 2)
+
   def test_buffersink(self):
     requestlog.initialize(sink=requestlog.sinks.BufferSink())
     self.log_something()